@@ -1,16 +1,21 @@
 import os
+import asyncio
+import json
 import logging
-from datetime import time
-import requests
+import pickle
+import sqlite3
+from collections import OrderedDict
+from contextlib import aclosing
+from dataclasses import dataclass
+from datetime import datetime, time
+import aiohttp
 import re
-from bs4 import BeautifulSoup
+import lxml.etree
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (
     ApplicationBuilder, CommandHandler, CallbackQueryHandler, ContextTypes,
     JobQueue
 )
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
 
 # Enable logging
 logging.basicConfig(
@@ -18,69 +23,192 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Global variables to store article data
-user_articles = {}  # Format: {user_id: {"article": article_data, "read": bool}}
+@dataclass(slots=True)
+class UserState:
+    """The article sent to a user and whether they have read it"""
+    article: dict
+    read: bool = False
+
 BASE_URL = "https://www.scientificamerican.com"
+REMINDER_HOURS = (15, 18, 21)
+WORDS_API_URL = "https://wordsapiv1.p.rapidapi.com/words"
+WORDS_API_HEADERS = {
+    "X-RapidAPI-Key": f"{os.getenv('X-RapidAPI-Key')}",
+    "X-RapidAPI-Host": "wordsapiv1.p.rapidapi.com"
+}
+STATE_DB = "state.db"
+ARTICLE_CACHE_FILE = "article_cache.pickle"
+WORD_CACHE_FILE = "word_cache.pickle"
+WORD_CACHE_SIZE = 50_000
+NON_WORD_RE = re.compile(r"[^\w']")
+ARTICLE_WORDS = 20
+KEY_WORDS = 5
+CHUNK_SIZE = 8192
+READ_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("✅ Mark as read", callback_data='mark_read')]
+])
+
+def open_state_db(path=STATE_DB):
+    """Open the SQLite database holding each user's article and read state"""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS user_state("
+        "chat_id INTEGER PRIMARY KEY, article_json TEXT, read INTEGER, updated_at INTEGER)"
+    )
+    return conn
+
+def load_user_state(conn, chat_id):
+    """Return the stored UserState for a chat, or None"""
+    row = conn.execute(
+        "SELECT article_json, read FROM user_state WHERE chat_id = ?", (chat_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    return UserState(json.loads(row[0]), bool(row[1]))
+
+def save_user_state(conn, chat_id, state):
+    """Store a chat's UserState, replacing any previous one"""
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO user_state(chat_id, article_json, read, updated_at) "
+            "VALUES (?, ?, ?, ?)",
+            (chat_id, json.dumps(state.article), int(state.read), int(datetime.now().timestamp())),
+        )
+
+def mark_article_read(conn, chat_id):
+    """Mark a chat's article as read; return False if it has none"""
+    with conn:
+        cursor = conn.execute(
+            "UPDATE user_state SET read = 1, updated_at = ? WHERE chat_id = ?",
+            (int(datetime.now().timestamp()), chat_id),
+        )
+    return cursor.rowcount > 0
+
+def load_cache(path, default):
+    """Load a pickled cache from disk, falling back to a default"""
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.PickleError, EOFError):
+        return default
+
+def save_cache(path, data):
+    """Pickle a cache to disk"""
+    try:
+        with open(path, 'wb') as f:
+            pickle.dump(data, f)
+    except OSError as e:
+        logger.warning(f"Could not save cache {path}: {e}")
+
+# The article is the same for every user on a given day, so fetch it once
+_article_cache = load_cache(ARTICLE_CACHE_FILE, {"date": None, "article": None})
+_article_lock = asyncio.Lock()
+# Definitions never change, so remember the most recently looked up words
+_word_cache = OrderedDict(load_cache(WORD_CACHE_FILE, {}))
+
+def remember_word(word, defs):
+    """Store a lookup result, evicting the least recently used words"""
+    _word_cache[word] = defs
+    _word_cache.move_to_end(word)
+    while len(_word_cache) > WORD_CACHE_SIZE:
+        _word_cache.popitem(last=False)
+    return defs
+
+async def fetch_word(session, word):
+    """Look up a word's definitions if it is rare enough to be worth learning"""
+    if word in _word_cache:
+        _word_cache.move_to_end(word)
+        return _word_cache[word]
+
+    freq_url = f"{WORDS_API_URL}/{word}/frequency"
+    async with session.get(freq_url, headers=WORDS_API_HEADERS) as freq_resp:
+        if freq_resp.status != 200:
+            return None
+        freq_data = (await freq_resp.json()).get("frequency", {})
+
+    zipf = freq_data.get("zipf", 0)
+    diversity = freq_data.get("diversity", 1)
+    if zipf > 4.5 or diversity > 0.3:
+        return remember_word(word, None)
+
+    url = f"{WORDS_API_URL}/{word}/definitions"
+    async with session.get(url, headers=WORDS_API_HEADERS) as response:
+        if response.status != 200:
+            return None
+        data = await response.json()
+
+    defs = data.get("definitions", [])
+    if defs:
+        return remember_word(word, [d['definition'] for d in defs[:3]])
+    return remember_word(word, "No definition found.")
 
-async def fetch_latest_article():
+def has_class(elem, name):
+    """Check whether an element has the given CSS class"""
+    return name in elem.get('class', '').split()
+
+async def iter_elements(response):
+    """Yield elements of an HTML response as soon as they are parsed"""
+    parser = lxml.etree.HTMLPullParser(events=('end',), encoding=response.charset)
+    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        parser.feed(chunk)
+        for _, elem in parser.read_events():
+            yield elem
+    parser.close()
+    for _, elem in parser.read_events():
+        yield elem
+
+async def fetch_latest_article(session):
     """Fetch the latest article from Scientific American"""
     try:
-        response = requests.get(BASE_URL)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        article_link = soup.find('a', class_='articleLink-2OMNo')['href']
+        # Stop downloading each page as soon as the needed elements are parsed
+        article_link = None
+        async with session.get(BASE_URL) as response:
+            response.raise_for_status()
+            async with aclosing(iter_elements(response)) as elements:
+                async for elem in elements:
+                    if elem.tag == 'a' and has_class(elem, 'articleLink-2OMNo'):
+                        article_link = elem.get('href')
+                        break
+        if not article_link:
+            raise ValueError("no article link found")
         if not article_link.startswith('http'):
             article_link = BASE_URL + article_link
         
-        article_response = requests.get(article_link)
-        article_response.raise_for_status()
-        article_soup = BeautifulSoup(article_response.text, 'html.parser')
-        
-        title = article_soup.find('h1', class_='article_hed-9vUZD').get_text(strip=True)
-        summary = article_soup.find('div', class_='body-n28ll prose-Yw0x0 prose-v4bYC article__body-ivA3W').get_text(strip=True)
-        article_body = article_soup.find('div', class_='body-n28ll prose-Yw0x0 prose-v4bYC article__body-ivA3W')
-        content = " ".join([p.get_text(strip=True) for p in article_body.find_all('p')])
+        title = None
+        words = []
+        async with session.get(article_link) as article_response:
+            article_response.raise_for_status()
+            async with aclosing(iter_elements(article_response)) as elements:
+                async for elem in elements:
+                    if elem.tag == 'h1' and has_class(elem, 'article_hed-9vUZD'):
+                        title = elem.xpath('string()').strip()
+                    elif elem.tag == 'p' and any(
+                        has_class(div, 'article__body-ivA3W') for div in elem.iterancestors('div')
+                    ):
+                        words.extend(elem.xpath('string()').split())
+                    if title is not None and len(words) >= ARTICLE_WORDS:
+                        break
+        if title is None:
+            raise ValueError("no article title found")
 
-        raw_words = content.split()[:20]
-        clean_words = []
+        # Keep the first unique long words, in the order they appear
+        key_words = {}
         
-        for word in raw_words:
-            clean_word = re.sub(r"[^\w']", '', word.lower())
+        for word in words[:ARTICLE_WORDS]:
+            clean_word = NON_WORD_RE.sub('', word.lower())
             
             if len(clean_word) > 5:
-                clean_words.append(clean_word)
+                key_words[clean_word] = None
+                if len(key_words) == KEY_WORDS:
+                    break
 
-        key_words = list(set(clean_words))[:5]
-        #words = content.split()[:20]
-        #key_words = list(set([word.lower() for word in words if len(word) > 5]))[:5]
+        key_words = list(key_words)
         
-        definitions = {}
-        key = os.getenv('X-RapidAPI-Key')
-        headers = {
-            "X-RapidAPI-Key": f"{key}",
-            "X-RapidAPI-Host": "wordsapiv1.p.rapidapi.com"
-        }
-        for word in key_words:
-            freq_url = f"https://wordsapiv1.p.rapidapi.com/words/{word}/frequency"
-            freq_resp = requests.get(freq_url, headers=headers)
-
-            if freq_resp.status_code == 200:
-                freq_data = freq_resp.json().get("frequency", {})
-                zipf = freq_data.get("zipf", 0)
-                diversity = freq_data.get("diversity", 1)
-
-                if zipf <= 4.5 and diversity <= 0.3:
-                    url = f"https://wordsapiv1.p.rapidapi.com/words/{word}/definitions"
-                    response = requests.get(url, headers=headers)
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        defs = data.get("definitions", [])
-                        
-                        if defs:
-                            definitions[word] = [d['definition'] for d in defs[:3]]
-                        else:
-                            definitions[word] = "No definition found."
+        results = await asyncio.gather(*[fetch_word(session, word) for word in key_words])
+        definitions = {word: defs for word, defs in zip(key_words, results) if defs is not None}
+        save_cache(WORD_CACHE_FILE, _word_cache)
                 
         return {
             "title": title,
@@ -91,6 +219,19 @@ async def fetch_latest_article():
         logger.error(f"Error fetching article: {e}")
         return None
 
+async def get_daily_article(session):
+    """Return today's article, fetching it only once per day"""
+    today = datetime.utcnow().date()
+    async with _article_lock:
+        if _article_cache["date"] != today:
+            article = await fetch_latest_article(session)
+            if not article:
+                return None
+            _article_cache["date"] = today
+            _article_cache["article"] = article
+            save_cache(ARTICLE_CACHE_FILE, _article_cache)
+    return _article_cache["article"]
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a message when the command /start is issued."""
     user = update.effective_user
@@ -110,23 +251,25 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 async def send_daily_article(context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send the daily article to all users"""
     job = context.job
-    article = await fetch_latest_article()
+    article = await get_daily_article(context.bot_data['http'])
     
     if not article:
         await context.bot.send_message(job.chat_id, text="Sorry, couldn't fetch an article today.")
         return
     
-    user_articles[job.chat_id] = {"article": article, "read": False}
+    save_user_state(context.bot_data['db'], job.chat_id, UserState(article))
     
-    key_words_text = ""
+    parts = []
 
     for word, defs in article["key_words"].items():
         if isinstance(defs, list):
-            definitions_formatted = "\n".join([f"   {i+1}. {definition}" for i, definition in enumerate(defs)])
+            definitions_formatted = "\n".join(f"   {i+1}. {definition}" for i, definition in enumerate(defs))
         else:
             definitions_formatted = f"   {defs}"
     
-        key_words_text += f"• *{word}*:\n{definitions_formatted}\n\n"
+        parts.append(f"• *{word}*:\n{definitions_formatted}\n\n")
+
+    key_words_text = "".join(parts)
     
     message = (
         f"📚 *{article['title']}*\n\n"
@@ -134,35 +277,41 @@ async def send_daily_article(context: ContextTypes.DEFAULT_TYPE) -> None:
         f"[Read full article]({article['link']})"
     )
     
-    keyboard = [
-        [InlineKeyboardButton("✅ Mark as read", callback_data='mark_read')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
     await context.bot.send_message(
         job.chat_id,
         text=message,
         parse_mode='Markdown',
         disable_web_page_preview=True,
-        reply_markup=reply_markup
+        reply_markup=READ_MARKUP
     )
 
+    # Remind the user later today until the article is marked as read
+    context.bot_data.setdefault('pending_reminders', {})[job.chat_id] = [
+        context.job_queue.run_once(
+            send_reminder,
+            when=time(hour=hour),
+            chat_id=job.chat_id,
+            name=f"reminder_{job.chat_id}_{hour}",
+        )
+        for hour in REMINDER_HOURS
+    ]
+
 async def send_reminder(context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send reminder if article hasn't been read"""
     job = context.job
-    if job.chat_id in user_articles and not user_articles[job.chat_id]["read"]:
-        article = user_articles[job.chat_id]["article"]
-        
-        keyboard = [
-            [InlineKeyboardButton("✅ Mark as read", callback_data='mark_read')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    pending = context.bot_data.get('pending_reminders', {}).get(job.chat_id, [])
+    if job in pending:
+        pending.remove(job)
+
+    state = load_user_state(context.bot_data['db'], job.chat_id)
+    if state and not state.read:
+        article = state.article
         
         await context.bot.send_message(
             job.chat_id,
             text=f"⏰ Reminder: Have you read today's article?\n*{article['title']}*",
             parse_mode='Markdown',
-            reply_markup=reply_markup
+            reply_markup=READ_MARKUP
         )
 
 async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -171,20 +320,27 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     user_id = query.from_user.id
     
     if query.data == 'mark_read':
-        if user_id in user_articles:
-            user_articles[user_id]["read"] = True
+        if mark_article_read(context.bot_data['db'], user_id):
             await query.answer("Article marked as read!")
             await query.edit_message_reply_markup(reply_markup=None)
             
             # Remove any pending reminders
-            job_names = [f"reminder_{user_id}_15", f"reminder_{user_id}_18", f"reminder_{user_id}_21"]
-            for job_name in job_names:
-                if context.job_queue.get_jobs_by_name(job_name):
-                    for job in context.job_queue.get_jobs_by_name(job_name):
-                        job.schedule_removal()
+            for job in context.bot_data.get('pending_reminders', {}).pop(user_id, []):
+                job.schedule_removal()
         else:
             await query.answer("No active article to mark as read.")
 
+async def post_init(application) -> None:
+    """Open the HTTP session and state database shared by all jobs."""
+    application.bot_data['db'] = open_state_db()
+    connector = aiohttp.TCPConnector(limit=10, keepalive_timeout=60)
+    application.bot_data['http'] = aiohttp.ClientSession(connector=connector)
+
+async def post_shutdown(application) -> None:
+    """Close the shared HTTP session and state database."""
+    await application.bot_data['http'].close()
+    application.bot_data['db'].close()
+
 def main() -> None:
     """Run the bot."""
     token = os.getenv('TELEGRAM_BOT_TOKEN')
@@ -192,25 +348,29 @@ def main() -> None:
         raise ValueError("Please set the TELEGRAM_BOT_TOKEN environment variable")
     
     # Create the Application
-    application = ApplicationBuilder().token(token).build()
+    application = (
+        ApplicationBuilder()
+        .token(token)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Register handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CallbackQueryHandler(button_click))
 
-    # Schedule reminders
-    scheduler = BackgroundScheduler()
-    for hour in [15, 18, 21]:
-        scheduler.add_job(
-            send_reminder,
-            trigger=CronTrigger(hour=hour, minute=0),
-            args=[application],
-            name=f"reminder_{hour}"
+    # Run the bot, letting Telegram push updates when a public URL is configured
+    webhook_url = os.getenv('WEBHOOK_URL')
+    if webhook_url:
+        application.run_webhook(
+            listen='0.0.0.0',
+            port=int(os.getenv('PORT', '8443')),
+            url_path=token,
+            webhook_url=f"{webhook_url.rstrip('/')}/{token}",
         )
-    scheduler.start()
-
-    # Run the bot
-    application.run_polling()
+    else:
+        application.run_polling()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file